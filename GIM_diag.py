@@ -1,214 +1,530 @@
 #!/usr/bin/env python3
+import asyncio
 import can
+import logging
+import os
+import socket
 import time
 import struct
 
+_log = logging.getLogger(__name__)
+
+# Non exportés par le module socket de CPython (valeurs Linux)
+_SO_BUSY_POLL = getattr(socket, 'SO_BUSY_POLL', 46)
+_SO_INCOMING_CPU = getattr(socket, 'SO_INCOMING_CPU', 49)
+
+# Structs pré-compilés pour les décodages récurrents (évite de recompiler
+# la chaîne de format à chaque trame)
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+_F32 = struct.Struct('<f')
+_PF = struct.Struct('<ff')
+# Octet de commande + 7 octets de bourrage à zéro, écrits en un seul
+# appel C (équivalent struct d'un store vectoriel)
+_CMD = struct.Struct('<B7x')
+# Heartbeat complet (erreur u32, état, flags) décodé en un seul appel
+_HB = struct.Struct('<IBB')
+# struct can_frame du noyau (can.h): id u32, dlc, 3 octets de bourrage,
+# 8 octets de données — pour la lecture brute sans allocation
+_FRAME = struct.Struct('=IB3x8s')
+
+# Décodage compilé si disponible (cythonize -3 --inplace gim_decode.pyx),
+# sinon repli sur struct — même signature, même tuple retourné
+try:
+    from gim_decode import decode_heartbeat as _decode_hb
+except ImportError:
+    def _decode_hb(data, _unpack=_HB.unpack_from):
+        return _unpack(data, 0)
+
+class _CmdRouter(can.Listener):
+    """Route chaque trame reçue vers la file de son cmd_id (O(1) par
+    trame, et les trames arrivées entre deux attentes ne sont plus
+    perdues)"""
+
+    def __init__(self, queues, on_heartbeat=None):
+        self._queues = queues
+        self._on_heartbeat = on_heartbeat
+
+    def on_message_received(self, msg):
+        cmd_id = msg.arbitration_id & 0x1F
+        if cmd_id == 0x001 and self._on_heartbeat is not None:
+            self._on_heartbeat(msg)
+        queue = self._queues.get(cmd_id)
+        if queue is None:
+            return
+        if queue.full():
+            queue.get_nowait()  # on ne garde que les trames récentes
+        queue.put_nowait(msg)
+
+    def stop(self):
+        pass
+
 class Gim6010CANDiagnostic:
-    def __init__(self, can_interface='can0', node_id=1):
+    # cmd_ids du protocole utilisés par le diagnostic
+    _CMD_IDS = (0x001, 0x003, 0x007, 0x009, 0x016, 0x01F)
+    # Décodage des réponses d'erreur piloté par table: un seul chemin,
+    # pas de chaîne de branchements par type
+    _ERR_DECODERS = {0: _U32, 1: _U64, 3: _U32, 4: _U32}
+    _ERR_LABELS = {0: 'système', 1: 'moteur', 3: 'contrôleur', 4: 'encodeur'}
+
+    def __init__(self, can_interface='can0', node_id=1, verbose=True,
+                 low_latency=False, pin_cpu=None):
         self.node_id = node_id
-        self.bus = can.interface.Bus(channel=can_interface, bustype='socketcan', bitrate=1000000)
-        
-    def send_command(self, cmd_id, data=None):
-        """Envoie une commande CAN au moteur"""
-        can_id = (self.node_id << 5) | cmd_id
-        if data is None:
-            data = [0] * 8
-        msg = can.Message(arbitration_id=can_id, data=data, is_extended_id=False)
-        self.bus.send(msg)
-        print(f"Commande envoyée: ID=0x{can_id:03X}, Data={data}")
-        
-    def wait_for_message(self, cmd_id, timeout=5):
-        """Attend un message spécifique"""
-        can_id = (self.node_id << 5) | cmd_id
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            msg = self.bus.recv(timeout=1)
-            if msg and msg.arbitration_id == can_id:
-                return msg
-        return None
-        
-    def get_heartbeat(self):
+        self.verbose = verbose
+        self.can_interface = can_interface
+        self.bus = can.Bus(channel=can_interface, interface='socketcan',
+                           bitrate=1000000, receive_own_messages=False)
+        # Filtre noyau fixe: seules les trames de ce node traversent
+        # (cmd_id dans les 5 bits bas, node_id au-dessus)
+        self.bus.set_filters([{'can_id': node_id << 5, 'can_mask': 0x7E0, 'extended': False}])
+        if low_latency:
+            # Busy-poll de 50 µs côté noyau: évite interruption + réveil
+            # de l'ordonnanceur sur chaque trame (nécessite CAP_NET_ADMIN)
+            try:
+                self.bus.socket.setsockopt(socket.SOL_SOCKET,
+                                           _SO_BUSY_POLL, 50)
+            except (AttributeError, OSError) as e:
+                _log.debug("SO_BUSY_POLL indisponible: %s", e)
+        if pin_cpu is not None:
+            # Épingle le process sur le cœur qui traite l'IRQ CAN (voir
+            # /proc/interrupts): évite les rebonds de lignes de cache
+            # entre cœurs à chaque trame
+            try:
+                os.sched_setaffinity(0, {pin_cpu})
+                self.bus.socket.setsockopt(socket.SOL_SOCKET,
+                                           _SO_INCOMING_CPU, pin_cpu)
+            except (AttributeError, OSError) as e:
+                _log.debug("épinglage CPU %d impossible: %s", pin_cpu, e)
+        # Une file bornée par cmd_id connu; le routeur y distribue les
+        # trames à mesure qu'elles arrivent
+        self._queues = {cid: asyncio.Queue(maxsize=16)
+                        for cid in self._CMD_IDS}
+        # Identifiants d'arbitrage précalculés: plus de décalage/OU par envoi
+        self._can_ids = {cid: (node_id << 5) | cid for cid in self._CMD_IDS}
+        self._router = _CmdRouter(self._queues, self._update_heartbeat)
+        self._notifier = None
+        # Dernier heartbeat reçu: (état, flags, erreur, horodatage monotone)
+        # et événement levé à chaque réception (réveil immédiat des
+        # superviseurs, sans palier de scrutation)
+        self._last_hb = None
+        self._hb_event = asyncio.Event()
+        # Les réponses d'erreur partagent cmd_id 0x003 sans écho du type:
+        # une seule requête en vol à la fois, sinon une réponse perdue
+        # décale l'appariement de toutes les suivantes
+        self._err_lock = asyncio.Lock()
+        # Tampon d'émission réutilisé: pas de liste de 8 éléments allouée
+        # à chaque envoi
+        self._txbuf = bytearray(8)
+        # Trames à contenu fixe, construites une fois pour toutes
+        # (évite liste + copie + construction de Message à chaque envoi)
+        self._msg_motor_cal = self._build_msg(0x007, bytes([4, 0, 0, 0, 0, 0, 0, 0]))
+        self._msg_encoder_cal = self._build_msg(0x007, bytes([7, 0, 0, 0, 0, 0, 0, 0]))
+        self._msg_idle = self._build_msg(0x007, bytes([1, 0, 0, 0, 0, 0, 0, 0]))
+        self._msg_enc_estimates = self._build_msg(0x009, bytes(8))
+        self._msg_save = self._build_msg(0x01F, bytes(8))
+        self._msg_reboot = self._build_msg(0x016, bytes(8))
+
+    def _build_msg(self, cmd_id, data):
+        return can.Message(arbitration_id=(self.node_id << 5) | cmd_id,
+                           data=data, is_extended_id=False)
+
+    def _update_heartbeat(self, msg):
+        """Met en cache chaque heartbeat 0x001 reçu (abonnement permanent)"""
+        error, axis_state, flags = _decode_hb(msg.data)
+        self._last_hb = (axis_state, flags, error, time.monotonic())
+        self._hb_event.set()
+
+    def _send_msg(self, msg):
+        """Envoie une trame pré-construite"""
+        self.bus.send(msg, timeout=0)
+        _log.debug("commande envoyée: id=0x%03X data=%s",
+                   msg.arbitration_id, msg.data)
+
+    async def start(self):
+        """Branche le lecteur asynchrone sur la boucle d'événements"""
+        self._notifier = can.Notifier(self.bus, [self._router],
+                                      loop=asyncio.get_running_loop())
+
+    def stop(self):
+        """Arrête le notifier et ferme le bus"""
+        if self._notifier is not None:
+            self._notifier.stop()
+            self._notifier = None
+        self.bus.shutdown()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _say(self, text):
+        """Affiche un message de statut (sauf en mode silencieux)"""
+        if self.verbose:
+            print(text)
+
+    def send_command(self, cmd_id, first_byte=0):
+        """Envoie une commande CAN au moteur (seul l'octet 0 varie)"""
+        can_id = self._can_ids.get(cmd_id)
+        if can_id is None:
+            can_id = (self.node_id << 5) | cmd_id
+        buf = self._txbuf
+        _CMD.pack_into(buf, 0, first_byte)
+        msg = can.Message(arbitration_id=can_id, data=bytes(buf),
+                          is_extended_id=False)
+        self.bus.send(msg, timeout=0)
+        _log.debug("commande envoyée: id=0x%03X octet0=%d", can_id, first_byte)
+
+    async def wait_for_message(self, cmd_id, timeout=5):
+        """Attend un message spécifique (déjà trié par le routeur)"""
+        queue = self._queues.get(cmd_id)
+        if queue is None:
+            # cmd_id hors du jeu connu: file créée à la demande, le
+            # routeur la sert dès la prochaine trame
+            queue = asyncio.Queue(maxsize=16)
+            self._queues[cmd_id] = queue
+        try:
+            return await asyncio.wait_for(queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def get_heartbeat(self):
         """Récupère le heartbeat du moteur"""
-        print("=== DEMANDE HEARTBEAT ===")
-        # Le heartbeat est envoyé périodiquement, on attend juste de le recevoir
-        msg = self.wait_for_message(0x001, timeout=3)
-        if msg:
-            axis_state = msg.data[4]
-            flags = msg.data[5]
-            error = struct.unpack('<I', msg.data[0:4])[0]
-            print(f"État: {axis_state}, Flags: {flags:08b}, Erreur: 0x{error:08X}")
+        self._say("=== DEMANDE HEARTBEAT ===")
+        # Le heartbeat est périodique: le cache suffit s'il est récent,
+        # sinon on attend la prochaine trame 0x001
+        hb = self._last_hb
+        if hb is None or time.monotonic() - hb[3] > 0.3:
+            # La file 0x001 peut retenir de vieux heartbeats: on attend
+            # une trame réellement reçue à partir de maintenant
+            if await self._wait_fresh_heartbeat(timeout=3):
+                hb = self._last_hb
+            else:
+                hb = None  # rien reçu pendant l'attente: cache périmé
+        if hb:
+            axis_state, flags, error = hb[0], hb[1], hb[2]
+            self._say(f"État: {axis_state}, Flags: {flags:08b}, Erreur: 0x{error:08X}")
             return axis_state, error
         else:
-            print("❌ Aucun heartbeat reçu")
+            self._say("❌ Aucun heartbeat reçu")
             return None, None
-            
-    def get_errors(self, error_type=0):
+
+    async def get_errors(self, error_type=0, timeout=3):
         """Récupère les erreurs (0=système, 1=moteur, 3=contrôleur, 4=encodeur)"""
-        print(f"=== DEMANDE ERREURS (type={error_type}) ===")
-        self.send_command(0x003, [error_type, 0, 0, 0, 0, 0, 0, 0])
-        
-        msg = self.wait_for_message(0x003, timeout=3)
+        self._say(f"=== DEMANDE ERREURS (type={error_type}) ===")
+        async with self._err_lock:
+            # Purge d'éventuelles réponses tardives d'une requête qui a
+            # expiré: elles seraient attribuées au mauvais type
+            queue = self._queues[0x003]
+            while not queue.empty():
+                queue.get_nowait()
+            self.send_command(0x003, error_type)
+            msg = await self.wait_for_message(0x003, timeout=timeout)
         if msg:
-            if error_type == 0:  # Système
-                error = struct.unpack('<I', msg.data[0:4])[0]
-                print(f"Erreur système: 0x{error:08X}")
-            elif error_type == 1:  # Moteur
-                error = struct.unpack('<Q', msg.data[0:8])[0]
-                print(f"Erreur moteur: 0x{error:016X}")
-            else:
-                error = struct.unpack('<I', msg.data[0:4])[0]
-                print(f"Erreur (type {error_type}): 0x{error:08X}")
+            decoder = self._ERR_DECODERS.get(error_type, _U32)
+            error = decoder.unpack_from(msg.data, 0)[0]
+            label = self._ERR_LABELS.get(error_type, f"type {error_type}")
+            self._say(f"Erreur {label}: 0x{error:0{decoder.size * 2}X}")
             return error
         else:
-            print("❌ Aucune réponse erreur")
+            self._say("❌ Aucune réponse erreur")
             return 0
-            
-    def test_motor_calibration(self):
+
+    async def get_errors_batch(self, types=(0, 1, 4), timeout=3):
+        """Récupère plusieurs types d'erreurs. Les requêtes 0x003 sont
+        sérialisées (les réponses ne portent pas le type demandé), mais
+        l'appelant peut les recouvrir avec d'autres phases"""
+        self._say(f"=== DEMANDE ERREURS (types={list(types)}) ===")
+        results = await asyncio.gather(*(self.get_errors(t, timeout=timeout)
+                                         for t in types))
+        return dict(zip(types, results))
+
+    async def test_motor_calibration(self):
         """Teste la calibration moteur"""
-        print("=== TEST CALIBRATION MOTEUR ===")
-        self.send_command(0x007, [4, 0, 0, 0, 0, 0, 0, 0])  # AXIS_STATE_MOTOR_CALIBRATION
-        
-        # Surveillance pendant 15 secondes
-        start_time = time.time()
+        self._say("=== TEST CALIBRATION MOTEUR ===")
+        self._send_msg(self._msg_motor_cal)  # AXIS_STATE_MOTOR_CALIBRATION
+
+        # Surveillance pendant 15 secondes via le cache heartbeat
+        start = time.monotonic()
+        deadline = start + 15
         success = False
-        while time.time() - start_time < 15:
-            msg = self.wait_for_message(0x001, timeout=1)
-            if msg:
-                axis_state = msg.data[4]
+        last_state = None
+        while time.monotonic() < deadline:
+            self._hb_event.clear()
+            hb = self._last_hb
+            if hb is not None and hb[3] >= start:
+                axis_state = hb[0]
                 if axis_state == 1:  # IDLE
-                    print("✅ Calibration moteur terminée")
+                    self._say("✅ Calibration moteur terminée")
                     success = True
                     break
-                elif axis_state == 4:
-                    print("Calibration en cours...")
-                    
+                elif axis_state == 4 and axis_state != last_state:
+                    self._say("Calibration en cours...")
+                last_state = axis_state
+            try:
+                # Réveil dès le prochain heartbeat, borné au temps restant
+                await asyncio.wait_for(self._hb_event.wait(),
+                                       deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+
         if not success:
-            print("❌ Timeout calibration moteur")
+            self._say("❌ Timeout calibration moteur")
             # Forcer l'arrêt
-            self.send_command(0x007, [1, 0, 0, 0, 0, 0, 0, 0])  # AXIS_STATE_IDLE
-            
+            self._send_msg(self._msg_idle)  # AXIS_STATE_IDLE
+
         return success
-        
-    def test_encoder_calibration(self):
+
+    async def test_encoder_calibration(self):
         """Teste la calibration encodeur"""
-        print("=== TEST CALIBRATION ENCODEUR ===")
-        self.send_command(0x007, [7, 0, 0, 0, 0, 0, 0, 0])  # AXIS_STATE_ENCODER_OFFSET_CALIBRATION
-        
-        # Surveillance pendant 20 secondes
-        start_time = time.time()
+        self._say("=== TEST CALIBRATION ENCODEUR ===")
+        self._send_msg(self._msg_encoder_cal)  # AXIS_STATE_ENCODER_OFFSET_CALIBRATION
+
+        # Surveillance pendant 20 secondes via le cache heartbeat
+        start = time.monotonic()
+        deadline = start + 20
         success = False
-        while time.time() - start_time < 20:
-            msg = self.wait_for_message(0x001, timeout=1)
-            if msg:
-                axis_state = msg.data[4]
+        last_state = None
+        while time.monotonic() < deadline:
+            self._hb_event.clear()
+            hb = self._last_hb
+            if hb is not None and hb[3] >= start:
+                axis_state = hb[0]
                 if axis_state == 1:  # IDLE
-                    print("✅ Calibration encodeur terminée")
+                    self._say("✅ Calibration encodeur terminée")
                     success = True
                     break
-                elif axis_state == 7:
-                    print("Calibration encodeur en cours...")
-                    
+                elif axis_state == 7 and axis_state != last_state:
+                    self._say("Calibration encodeur en cours...")
+                last_state = axis_state
+            try:
+                # Réveil dès le prochain heartbeat, borné au temps restant
+                await asyncio.wait_for(self._hb_event.wait(),
+                                       deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+
         if not success:
-            print("❌ Timeout calibration encodeur")
+            self._say("❌ Timeout calibration encodeur")
             # Forcer l'arrêt
-            self.send_command(0x007, [1, 0, 0, 0, 0, 0, 0, 0])  # AXIS_STATE_IDLE
-            
+            self._send_msg(self._msg_idle)  # AXIS_STATE_IDLE
+
         return success
-        
-    def get_encoder_estimates(self):
+
+    async def get_encoder_estimates(self):
         """Récupère les estimations de l'encodeur"""
-        print("=== DEMANDE ESTIMATIONS ENCODEUR ===")
-        self.send_command(0x009)  # Get_Encoder_Estimates
-        
-        msg = self.wait_for_message(0x009, timeout=3)
+        self._say("=== DEMANDE ESTIMATIONS ENCODEUR ===")
+        self._send_msg(self._msg_enc_estimates)  # Get_Encoder_Estimates
+
+        msg = await self.wait_for_message(0x009, timeout=3)
         if msg:
-            pos = struct.unpack('<f', msg.data[0:4])[0]
-            vel = struct.unpack('<f', msg.data[4:8])[0]
-            print(f"Position: {pos:.2f} tours, Vitesse: {vel:.2f} tours/s")
+            pos, vel = _PF.unpack_from(msg.data, 0)
+            self._say(f"Position: {pos:.2f} tours, Vitesse: {vel:.2f} tours/s")
             return pos, vel
         else:
-            print("❌ Aucune réponse encodeur")
+            self._say("❌ Aucune réponse encodeur")
             return None, None
-            
-    def save_and_reboot(self):
-        """Sauvegarde et redémarre"""
-        print("=== SAUVEGARDE CONFIGURATION ===")
-        self.send_command(0x01F)  # Save_Configuration
-        time.sleep(3)
-        
-        print("=== REDÉMARRAGE ===")
-        self.send_command(0x016)  # Reboot
-        time.sleep(3)
-        
-    def full_diagnostic(self):
+
+    def _count_raw_frames(self, duration):
+        """Compte trames et octets reçus pendant `duration` via une socket
+        CAN_RAW dédiée (recv_into dans un tampon réutilisé: zéro allocation
+        par trame, contrairement à bus.recv qui construit un Message)"""
+        sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+        sock.bind((self.can_interface,))
+        sock.settimeout(0.05)
+        buf = bytearray(16)
+        view = memoryview(buf)
+        frames = 0
+        payload_bytes = 0
+        deadline = time.monotonic() + duration
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    n = sock.recv_into(view)
+                except socket.timeout:
+                    continue
+                if n < _FRAME.size:
+                    continue
+                frames += 1
+                payload_bytes += _FRAME.unpack_from(buf)[1]  # dlc
+        finally:
+            sock.close()
+        return frames, payload_bytes
+
+    async def measure_bus_load(self, duration=0.5):
+        """Mesure la charge du bus (toutes trames, sans filtre node)"""
+        self._say("=== MESURE CHARGE BUS ===")
+        try:
+            frames, payload_bytes = await asyncio.get_running_loop().run_in_executor(
+                None, self._count_raw_frames, duration)
+        except OSError as e:
+            _log.debug("mesure de charge indisponible: %s", e)
+            self._say("⚠️  Mesure de charge bus indisponible")
+            return None
+        rate = frames / duration
+        self._say(f"Charge bus: {frames} trames en {duration:.1f} s "
+                  f"(~{rate:.0f} trames/s, {payload_bytes} octets utiles)")
+        return rate
+
+    async def _wait_fresh_heartbeat(self, timeout):
+        """Attend un heartbeat reçu après l'instant d'appel (le cache et
+        la file 0x001 peuvent contenir des trames antérieures)"""
+        start = time.monotonic()
+        deadline = start + timeout
+        while time.monotonic() < deadline:
+            self._hb_event.clear()
+            hb = self._last_hb
+            if hb is not None and hb[3] >= start:
+                return True
+            try:
+                await asyncio.wait_for(self._hb_event.wait(),
+                                       deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+        return False
+
+    async def _wait_save_ack(self, timeout=3.0):
+        """Attend le premier heartbeat postérieur à la sauvegarde: le
+        firmware recommence à émettre 0x001 une fois l'écriture flash finie"""
+        if await self._wait_fresh_heartbeat(timeout):
+            return True
+        self._say("⚠️  Pas de heartbeat après la sauvegarde")
+        return False
+
+    async def save_and_reboot(self, save_delay=0.5, reboot_delay=2.0):
+        """Sauvegarde et redémarre (délais ajustables au lieu des 6 s fixes)"""
+        self._say("=== SAUVEGARDE CONFIGURATION ===")
+        self._send_msg(self._msg_save)  # Save_Configuration
+        await asyncio.sleep(save_delay)
+        await self._wait_save_ack(timeout=3.0)
+
+        self._say("=== REDÉMARRAGE ===")
+        self._send_msg(self._msg_reboot)  # Reboot
+        await asyncio.sleep(reboot_delay)
+
+    async def _run_phases(self, phases):
+        """Exécute un plan de phases en DAG: chaque phase démarre dès que
+        ses dépendances sont terminées, les phases indépendantes tournent
+        en parallèle (durée totale = chemin critique, pas la somme).
+        Chaque fabrique reçoit le dict des résultats déjà acquis."""
+        pending = {name: (deps, factory) for name, deps, factory in phases}
+        running = {}
+        results = {}
+        try:
+            while pending or running:
+                ready = [name for name, (deps, _) in pending.items()
+                         if all(dep in results for dep in deps)]
+                for name in ready:
+                    _, factory = pending.pop(name)
+                    running[name] = asyncio.create_task(factory(results))
+                done, _ = await asyncio.wait(running.values(),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for name, task in list(running.items()):
+                    if task in done:
+                        results[name] = task.result()
+                        del running[name]
+        finally:
+            # Si une phase échoue (ou si on est annulé), ne pas abandonner
+            # les tâches en vol — p. ex. une calibration déjà commandée au
+            # moteur — sans les annuler et attendre leur fin
+            if running:
+                for task in running.values():
+                    task.cancel()
+                await asyncio.gather(*running.values(), return_exceptions=True)
+        return results
+
+    async def _maybe_motor_calibration(self, system_error, motor_error):
+        """Saute la calibration moteur si une erreur connue la condamne
+        (économise jusqu'à 15 s sur un diagnostic déjà en échec)"""
+        if system_error != 0 or motor_error != 0:
+            self._say("⏭️  Calibration moteur sautée (erreurs existantes)")
+            return False
+        return await self.test_motor_calibration()
+
+    async def _maybe_encoder_calibration(self, encoder_error):
+        """Saute la calibration encodeur si l'encodeur est déjà en erreur
+        (économise jusqu'à 20 s)"""
+        if encoder_error != 0:
+            self._say("⏭️  Calibration encodeur sautée (erreurs existantes)")
+            return False
+        return await self.test_encoder_calibration()
+
+    async def full_diagnostic(self):
         """Effectue un diagnostic complet via CAN"""
-        print("=== DÉBUT DIAGNOSTIC COMPLET VIA CAN ===")
-        
+        self._say("=== DÉBUT DIAGNOSTIC COMPLET VIA CAN ===")
+
         # 1. Vérifier le heartbeat
-        print("\n1. Test de communication...")
-        state, error = self.get_heartbeat()
+        self._say("\n1. Test de communication...")
+        state, error = await self.get_heartbeat()
         if state is None:
-            print("❌ Impossible de communiquer avec le moteur")
+            self._say("❌ Impossible de communiquer avec le moteur")
             return False
-            
-        # 2. Vérifier les erreurs
-        print("\n2. Vérification des erreurs...")
-        system_error = self.get_errors(0)
-        motor_error = self.get_errors(1)
-        encoder_error = self.get_errors(4)
-        
-        # 3. Vérifier les estimations encodeur
-        print("\n3. Test de l'encodeur...")
-        pos, vel = self.get_encoder_estimates()
-        
-        # 4. Test calibration moteur
-        print("\n4. Test calibration moteur...")
-        motor_ok = self.test_motor_calibration()
-        
-        # 5. Test calibration encodeur
-        print("\n5. Test calibration encodeur...")
-        encoder_ok = self.test_encoder_calibration()
-        
-        # 6. Sauvegarde et redémarrage
-        print("\n6. Sauvegarde et redémarrage...")
-        self.save_and_reboot()
-        
-        # 7. Résultat final
-        print("\n=== RÉSULTAT DU DIAGNOSTIC ===")
-        print(f"Communication: ✅")
-        print(f"Erreurs système: {'❌' if system_error != 0 else '✅'}")
-        print(f"Erreurs moteur: {'❌' if motor_error != 0 else '✅'}")
-        print(f"Erreurs encodeur: {'❌' if encoder_error != 0 else '✅'}")
-        print(f"Calibration moteur: {'✅' if motor_ok else '❌'}")
-        print(f"Calibration encodeur: {'✅' if encoder_ok else '❌'}")
-        
-        overall_ok = (system_error == 0 and motor_error == 0 and 
+
+        # 2. Erreurs, encodeur, charge bus et calibrations, planifiés en
+        # DAG: les lectures d'erreurs, l'estimation encodeur et la mesure
+        # de charge sont indépendantes (la mesure tourne dans l'executor,
+        # recouverte par les autres phases), seules les calibrations
+        # attendent un état d'erreur connu
+        self._say("\n2. Erreurs, encodeur et calibrations...")
+        results = await self._run_phases([
+            ("bus_load", (), lambda r: self.measure_bus_load(0.5)),
+            ("err_sys", (), lambda r: self.get_errors(0)),
+            ("err_mot", (), lambda r: self.get_errors(1)),
+            ("err_enc", (), lambda r: self.get_errors(4)),
+            ("enc_est", (), lambda r: self.get_encoder_estimates()),
+            ("mot_cal", ("err_sys", "err_mot"),
+             lambda r: self._maybe_motor_calibration(r["err_sys"], r["err_mot"])),
+            ("enc_cal", ("mot_cal", "err_enc"),
+             lambda r: self._maybe_encoder_calibration(r["err_enc"])),
+        ])
+        system_error = results["err_sys"]
+        motor_error = results["err_mot"]
+        encoder_error = results["err_enc"]
+        pos, vel = results["enc_est"]
+        motor_ok = results["mot_cal"]
+        encoder_ok = results["enc_cal"]
+
+        # 3. Sauvegarde et redémarrage
+        self._say("\n3. Sauvegarde et redémarrage...")
+        await self.save_and_reboot()
+
+        # 4. Résultat final
+        self._say("\n=== RÉSULTAT DU DIAGNOSTIC ===")
+        self._say(f"Communication: ✅")
+        self._say(f"Erreurs système: {'❌' if system_error != 0 else '✅'}")
+        self._say(f"Erreurs moteur: {'❌' if motor_error != 0 else '✅'}")
+        self._say(f"Erreurs encodeur: {'❌' if encoder_error != 0 else '✅'}")
+        self._say(f"Calibration moteur: {'✅' if motor_ok else '❌'}")
+        self._say(f"Calibration encodeur: {'✅' if encoder_ok else '❌'}")
+
+        overall_ok = (system_error == 0 and motor_error == 0 and
                      encoder_error == 0 and motor_ok and encoder_ok)
-        
+
         if overall_ok:
-            print("\n🎉 DIAGNOSTIC: TOUT EST OK !")
+            self._say("\n🎉 DIAGNOSTIC: TOUT EST OK !")
         else:
-            print("\n💥 DIAGNOSTIC: DES PROBLÈMES ONT ÉTÉ DÉTECTÉS")
-            
+            self._say("\n💥 DIAGNOSTIC: DES PROBLÈMES ONT ÉTÉ DÉTECTÉS")
+
         return overall_ok
 
-# Utilisation
-if __name__ == "__main__":
-    try:
-        # Initialiser avec l'ID du moteur
-        diagnostic = Gim6010CANDiagnostic(can_interface='can0', node_id=1)
-        
+async def main():
+    # Initialiser avec l'ID du moteur; le gestionnaire de contexte garantit
+    # l'arrêt du notifier et la fermeture du bus, y compris sur erreur
+    async with Gim6010CANDiagnostic(can_interface='can0', node_id=1) as diagnostic:
         # Lancer le diagnostic complet
-        success = diagnostic.full_diagnostic()
-        
+        success = await diagnostic.full_diagnostic()
+
         if success:
             print("\nLe moteur est prêt à être utilisé !")
         else:
             print("\nDes actions correctives sont nécessaires.")
-            
+
+# Utilisation
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
     except KeyboardInterrupt:
         print("\n⚠️  Interruption utilisateur")
     except Exception as e:
         print(f"\n❌ Erreur: {e}")
-    finally:
-        diagnostic.bus.shutdown()
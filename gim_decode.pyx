@@ -0,0 +1,15 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""Décodage compilé des trames GIM6010 (module optionnel).
+
+Compilation: cythonize -3 --inplace gim_decode.pyx
+GIM_diag retombe sur struct si le module compilé est absent — utile
+surtout pour journaliser les heartbeats au débit du bus (~8000 trames/s
+à 1 Mbit), où le décodage Python devient le goulot avant la socket.
+"""
+
+
+cpdef tuple decode_heartbeat(const unsigned char[::1] d):
+    """Retourne (erreur u32, état d'axe, flags) d'une trame 0x001"""
+    cdef unsigned int error = (d[0] | (d[1] << 8) | (d[2] << 16)
+                               | (<unsigned int> d[3] << 24))
+    return error, d[4], d[5]